@@ -33,16 +33,17 @@ generated using Kedro 0.16.4
 
 from kedro.pipeline import Pipeline, node
 
-from .nodes import calculate_shap
+from .nodes import build_explainer, calculate_shap
 
 
 def create_pipeline(**kwargs):
     return Pipeline(
         [
+            node(build_explainer, "example_model", "shap_explainer"),
             node(
                 calculate_shap,
-                ["example_model", "example_train_x", "parameters"],
+                ["shap_explainer", "example_train_x", "parameters"],
                 "shap_values",
-            )
+            ),
         ]
     )
@@ -33,14 +33,19 @@ Useful links:
 - more attributes for html tag: https://www.w3schools.com/tags/tag_img.asp
 """
 
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 import shap
 from matplotlib import pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
-from plotly.tools import mpl_to_plotly
+from dash.exceptions import PreventUpdate
 import plotly.graph_objs as go
 from kedro.framework.context import load_context
 
@@ -57,7 +62,22 @@ project_context = load_context(".")
 io = project_context.io
 
 train_x = io.load("example_train_x")
-shap_values = io.load("shap_values")
+# float32 is plenty for plotting (already the dtype written by the shap pipeline)
+shap_values = io.load("shap_values").astype(np.float32, copy=False)
+
+# Feature columns are static for the session, so slice them out only once,
+# as a one-time float32 copy shared by every callback.
+feature_cols = list(shap_values.columns)
+train_x_features = train_x[feature_cols].astype(np.float32)
+shap_array = shap_values.to_numpy()
+
+# Low-cardinality columns can be used as segments (one vectorised nunique pass)
+n_unique = train_x.nunique()
+segment_cols = n_unique[n_unique <= 5].index.tolist()
+
+# Feature importance order (ascending, most important last)
+mean_abs_shap = np.abs(shap_array).mean(axis=0)
+feature_order = np.argsort(mean_abs_shap)
 
 
 ############################ styles ##############################
@@ -71,8 +91,8 @@ tab_default_style = {"fontSize": 20}
 tab_selected_style = {"fontSize": 20, "backgroundColor": "#86caf9"}
 dropdown_style = {"fontSize": 16, "width": "50%"}
 summary_plot_style = {
-    "height": "30%",
     "width": "60%",
+    "display": "inline-block",
 }
 pdp_plot_stype = {
     "height": "50%",
@@ -83,9 +103,80 @@ pdp_plot_stype = {
 plt.switch_backend("Agg")
 
 
+############################ figures ##############################
+def _render_summary_plot(plot_type):
+    # Build the SHAP summary plot natively in plotly,
+    # features are sorted so the most important one is on top
+    ordered_cols = [feature_cols[i] for i in feature_order]
+
+    if plot_type == "bar":
+        fig = go.Figure(
+            go.Bar(
+                x=mean_abs_shap[feature_order],
+                y=ordered_cols,
+                orientation="h",
+                marker_color="#1E88E5",
+            )
+        )
+        fig.update_layout(
+            xaxis_title="mean(|SHAP value|) (average impact on model output magnitude)"
+        )
+        return fig
+
+    # Dot plot: one row of jittered points per feature,
+    # colored by the feature value (5th-95th percentile, like SHAP).
+    # Scattergl draws with WebGL, so it stays responsive for large datasets
+    fig = go.Figure()
+    jitter = np.random.RandomState(0).uniform(-0.3, 0.3, size=len(shap_array))
+    for row, i in enumerate(feature_order):
+        values = train_x_features.iloc[:, i].to_numpy()
+        vmin, vmax = np.nanpercentile(values, [5, 95])
+        if vmax > vmin:
+            color = np.clip((values - vmin) / (vmax - vmin), 0, 1)
+        else:
+            color = np.full(len(values), 0.5)
+        fig.add_trace(
+            go.Scattergl(
+                x=shap_array[:, i],
+                y=row + jitter,
+                mode="markers",
+                name=feature_cols[i],
+                showlegend=False,
+                marker=dict(
+                    size=4,
+                    color=color,
+                    colorscale="RdBu_r",
+                    cmin=0,
+                    cmax=1,
+                    showscale=(row == 0),
+                    colorbar=dict(
+                        title="Feature value",
+                        tickvals=[0, 1],
+                        ticktext=["Low", "High"],
+                    ),
+                ),
+            )
+        )
+    fig.update_layout(
+        xaxis_title="SHAP value (impact on model output)",
+        yaxis=dict(tickvals=list(range(len(ordered_cols))), ticktext=ordered_cols),
+    )
+    return fig
+
+
+# There are only two plot types and the data is static,
+# so render both once at start-up and let the browser switch between them
+summary_cache = {
+    plot_type: _render_summary_plot(plot_type).to_dict() for plot_type in ["dot", "bar"]
+}
+
+
 ############################ layout ##############################
 # Create app (usually don't change)
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+# compress: gzip responses, the PDP plots are sent as base64 images
+app = dash.Dash(__name__, external_stylesheets=external_stylesheets, compress=True)
+# Flask server for WSGI deployment (see README.md)
+server = app.server
 
 # Define the components of the whole app
 app.layout = html.Div(
@@ -130,11 +221,11 @@ app.layout = html.Div(
                         # 1.2 Plot
                         html.Div(
                             children=[
-                                html.Img(
+                                dcc.Graph(
                                     id="summary_plot",  # unique id of the component
-                                    src="",
                                     style=summary_plot_style,
                                 ),
+                                dcc.Store(id="summary_cache", data=summary_cache),
                             ],
                             style={"text-align": "center"},
                         ),
@@ -160,8 +251,7 @@ app.layout = html.Div(
                                 dcc.Dropdown(
                                     id="feature_name_tab2",
                                     options=[
-                                        {"label": i, "value": i}
-                                        for i in shap_values.columns
+                                        {"label": i, "value": i} for i in feature_cols
                                     ],
                                     value=None,
                                     placeholder="Select feature column to plot on the x-axis",
@@ -182,8 +272,7 @@ app.layout = html.Div(
                                 dcc.Dropdown(
                                     id="interaction_name",
                                     options=[
-                                        {"label": i, "value": i}
-                                        for i in shap_values.columns
+                                        {"label": i, "value": i} for i in feature_cols
                                     ],
                                     value="auto",
                                     placeholder="Select interaction feature for color-code",
@@ -241,8 +330,7 @@ app.layout = html.Div(
                                 dcc.Dropdown(
                                     id="feature_name_tab3",
                                     options=[
-                                        {"label": i, "value": i}
-                                        for i in shap_values.columns
+                                        {"label": i, "value": i} for i in feature_cols
                                     ],
                                     value=None,
                                     placeholder="Select feature column to plot on the x-axis",
@@ -263,9 +351,7 @@ app.layout = html.Div(
                                 dcc.Dropdown(
                                     id="segment_name",
                                     options=[
-                                        {"label": i, "value": i}
-                                        for i in train_x.columns
-                                        if train_x[i].nunique() <= 5
+                                        {"label": i, "value": i} for i in segment_cols
                                     ],
                                     value=None,
                                     placeholder="Select segment column",
@@ -315,24 +401,61 @@ app.layout = html.Div(
 
 ###################### callbacks for Tab 1 ###########################
 # choose plot type from dropdown menu,
-# generate summary plot
-@app.callback(Output("summary_plot", "src"), [Input("plot_type", "value")])
+# pick the matching pre-rendered summary plot in the browser
 # Input: dcc.Dropdown component with unique id = "plot_type"
-# Output: html.Img component with unique id = "summary_plot"
-def _generate_summary_plot(plot_type):
-    feature_cols = shap_values.columns
-    shap.summary_plot(
-        shap_values.to_numpy(), train_x[feature_cols], plot_type=plot_type, show=False
+# State: dcc.Store component with unique id = "summary_cache"
+# Output: dcc.Graph component with unique id = "summary_plot"
+app.clientside_callback(
+    """
+    function(plot_type, summary_cache) {
+        // A cleared dropdown falls back to SHAP's default dot plot
+        return summary_cache[plot_type || "dot"];
+    }
+    """,
+    Output("summary_plot", "figure"),
+    [Input("plot_type", "value")],
+    [State("summary_cache", "data")],
+)
+
+
+###################### callbacks for Tab 2 ###########################
+def _new_pdp_figure():
+    # A Figure owned by the callback (not pyplot's global current figure),
+    # so concurrent callbacks never draw on each other's plots
+    fig = Figure(figsize=(7.5, 5))
+    FigureCanvasAgg(fig)
+    return fig
+
+
+# Resolve SHAP's "auto" interaction feature only for the features a user picks,
+# once each, instead of for every column at startup or on every PDP callback
+@lru_cache(maxsize=None)
+def _auto_interaction_col(feature_name):
+    return feature_cols[
+        shap.approximate_interactions(feature_name, shap_array, train_x_features)[0]
+    ]
+
+
+# The plot is a pure function of the three inputs, so cache the encoded images
+@lru_cache(maxsize=64)
+def _render_pdp_plot(feature_name, interaction_name, median_line):
+    if interaction_name == "auto":
+        interaction_name = _auto_interaction_col(feature_name)
+    fig = _new_pdp_figure()
+    plot_shap_dependence_plot_with_interaction(
+        feature_col=feature_name,
+        shap_value_df=shap_values,
+        data_df=train_x_features,
+        interaction_col=interaction_name,
+        plot_median_line=(median_line == "yes"),
+        ax=fig.add_subplot(111),
     )
-    plt.tight_layout()
-    fig = plt.gcf()
-    # Convert plt.figure object to base64 encoding
+    fig.tight_layout()
+    # Convert Figure object to base64 encoding
     # Don't need if use plotly library (plotly.express) to plot
-    plotly_fig = _fig_to_uri(fig)
-    return plotly_fig
+    return _fig_to_uri(fig)
 
 
-###################### callbacks for Tab 2 ###########################
 # choose feature name, interaction name, and whether to plot median line
 # generate PDP plot
 @app.callback(
@@ -342,25 +465,34 @@ def _generate_summary_plot(plot_type):
         Input("interaction_name", "value"),
         Input("median_line_tab2", "value"),
     ],
+    prevent_initial_call=True,  # no feature is selected on page load
 )
 def _generate_pdp_plot(feature_name, interaction_name, median_line):
-    if feature_name:
-        plot_shap_dependence_plot_with_interaction(
-            feature_col=feature_name,
-            shap_value_df=shap_values,
-            data_df=train_x,
-            interaction_col=interaction_name,
-            plot_median_line=(median_line == "yes"),
-        )
-        plt.tight_layout()
-        fig = plt.gcf()
-        # Convert plt.figure object to base64 encoding
-        # Don't need if use plotly library (plotly.express) to plot
-        plotly_fig = _fig_to_uri(fig)
-        return plotly_fig
+    if not feature_name:
+        # Leave the current plot untouched until a feature is selected
+        raise PreventUpdate
+    return _render_pdp_plot(feature_name, interaction_name, median_line)
 
 
 ###################### callbacks for Tab 3 ###########################
+# The plot is a pure function of the three inputs, so cache the encoded images
+@lru_cache(maxsize=64)
+def _render_pdp_plot_by_segment(feature_name, segment_name, median_line):
+    fig = _new_pdp_figure()
+    plot_shap_dependence_plot_by_segment(
+        feature_col=feature_name,
+        shap_value_df=shap_values,
+        data_df=train_x,
+        segment_col=segment_name,
+        plot_median_line=(median_line == "yes"),
+        ax=fig.add_subplot(111),
+    )
+    fig.tight_layout()
+    # Convert Figure object to base64 encoding
+    # Don't need if use plotly library (plotly.express) to plot
+    return _fig_to_uri(fig)
+
+
 # choose feature name, interaction name, and whether to plot median line
 # generate PDP plot
 @app.callback(
@@ -370,23 +502,16 @@ def _generate_pdp_plot(feature_name, interaction_name, median_line):
         Input("segment_name", "value"),
         Input("median_line_tab3", "value"),
     ],
+    prevent_initial_call=True,  # no feature is selected on page load
 )
 def _generate_pdp_plot_by_segment(feature_name, segment_name, median_line):
-    if feature_name:
-        plot_shap_dependence_plot_by_segment(
-            feature_col=feature_name,
-            shap_value_df=shap_values,
-            data_df=train_x,
-            segment_col=segment_name,
-            plot_median_line=(median_line == "yes"),
-        )
-        plt.tight_layout()
-        fig = plt.gcf()
-        # Convert plt.figure object to base64 encoding
-        # Don't need if use plotly library (plotly.express) to plot
-        plotly_fig = _fig_to_uri(fig)
-        return plotly_fig
+    if not feature_name:
+        # Leave the current plot untouched until a feature is selected
+        raise PreventUpdate
+    return _render_pdp_plot_by_segment(feature_name, segment_name, median_line)
 
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
+    # Debug mode adds the reloader and per-callback prop validation,
+    # turn it on only while developing the app
+    app.run_server(debug=False)
@@ -31,22 +31,33 @@
 from typing import List, Tuple, Union
 from io import BytesIO
 import base64
+import importlib.util
 import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.axes import Axes
 from matplotlib.patches import Patch
+import numpy as np
 import pandas as pd
 import shap
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional, medians fall back to pure NumPy
+    njit = None
+
+# Above this many points, the "auto" backend rasterizes scatters with datashader
+DATASHADER_MIN_POINTS = 50_000
+
+# Segment colors, looked up once rather than on every plot
+_SEGMENT_COLORS = np.asarray(plt.get_cmap("Set1").colors)
+
 
 # Helper function to encode matplotlib image
-# Needed when the figure is a plt.figure object
-def _fig_to_uri(in_fig, close_all=True, **save_args):
-    """Save a plt.figure as a URI (str)."""
+# Needed when the figure is a matplotlib Figure object
+def _fig_to_uri(in_fig, **save_args):
+    """Save a matplotlib Figure as a URI (str)."""
     out_img = BytesIO()
     in_fig.savefig(out_img, format="png", **save_args)
-    if close_all:
-        in_fig.clf()
-        plt.close("all")
     out_img.seek(0)  # rewind file
     encoded = base64.b64encode(out_img.read()).decode("ascii").replace("\n", "")
     return "data:image/png;base64,{}".format(encoded)
@@ -60,10 +71,11 @@ def plot_shap_dependence_plot_with_interaction(
     plot_median_line: bool = False,
     selected_xlim: Union[List[float], None] = None,
     selected_ylim: Union[List[float], None] = None,
-    figsize: List[int] = [15, 10],
+    figsize: Tuple[int, int] = (15, 10),
     plot_histogram: bool = True,
     nbins: int = 35,
-) -> None:
+    ax: Union[Axes, None] = None,
+) -> Axes:
     """Plots dependence plot with overlapping histogram and interaction column.
 
     Args:
@@ -76,47 +88,92 @@ def plot_shap_dependence_plot_with_interaction(
         plot_median_line (boolean): whether to show the median line for the interaction feature
         selected_xlim (list of two float or None): lower bound and upper bound of the x axis
         selected_ylim (list of two float or None): lower bound and upper bound of the y axis
-        figsize (list of two int): size of the plot
+        figsize (tuple of two int): size of the new figure created when ax is None
         plot_histogram (boolean): if True, a population histogram will be plotted in the background
-        nbins (int): the number of bins in histogram
+        nbins (int): the number of bins in histogram, also used by the median line
+                     of a feature with more than nbins distinct values.
+        ax (matplotlib Axes or None): the axes to draw on, a new figure is created if None.
+                                      A given axes is cleared first, so it can be reused.
 
     Returns:
+        The axes drawn on.
         Scatter plot of SHAP values for the selected feature.
         Creates histogram of the selected feature in the background.
         Interaction column on the right-side panel.
         Color-code the scatter plot by interaction column.
 
     """
-    # Retrieve configuration parameters
-    selected_feature_cols = shap_value_df.columns
-
-    # Build contri_df for median lines
-    median_shap_df = _calculate_median_shap_df(feature_col, data_df, shap_value_df)
-
-    # SHAP plot
-    shap_args = {
-        "ind": feature_col,
-        "shap_values": shap_value_df.loc[:, selected_feature_cols].values,
-        "features": data_df.loc[:, selected_feature_cols],
-        "interaction_index": interaction_col,
-        "alpha": 0.5,
-        "dot_size": 10,
-        "show": False,
-    }
-    shap.dependence_plot(**shap_args)
-    plt.title("{} Contribution to {}".format(feature_col, "target variable"))
+    # Extract the plotted columns once, shared by scatter, median line and histogram.
+    # Plotting gains nothing from float64, float32 halves the data to draw.
+    feature_values = _to_float32_array(data_df[feature_col])
+    shap_values = _to_float32_array(shap_value_df[feature_col])
+    # Bin the feature for the histogram, reused by a binned median line
+    feature_bins = _bin_feature(feature_values, nbins) if plot_histogram else None
+
+    # Build contri_df for median lines (only needed when they are plotted)
+    median_shap_df = None
+    if plot_median_line:
+        median_shap_df = _calculate_median_shap_df(
+            feature_col,
+            feature_values,
+            shap_values,
+            median_nbins=nbins,
+            feature_bins=feature_bins,
+        )
+
+    # Clear a reused axes (and its histogram twin) before drawing again
+    reuse_ax = ax is not None
+    if reuse_ax:
+        _clear_axes(ax)
+        axes_before = ax.figure.axes
+        position_before = ax.get_position(original=True)
+    else:
+        # Size the new figure before drawing, so the layout uses its final extent
+        ax = plt.figure(figsize=figsize).gca()
+
+    if interaction_col is None:
+        # Without an interaction term there is nothing for shap to color,
+        # so draw its one-color scatter directly
+        _scatter_without_interaction(ax, feature_col, feature_values, shap_values)
+    else:
+        # SHAP plot, with columns given by position so shap skips its name scans
+        selected_feature_cols = shap_value_df.columns
+        # Only re-slice the data when it carries extra (non-feature) columns
+        if data_df.columns.equals(selected_feature_cols):
+            feature_df = data_df
+        else:
+            feature_df = data_df.loc[:, selected_feature_cols]
+        if interaction_col != "auto":
+            interaction_col = selected_feature_cols.get_loc(interaction_col)
+        shap_args = {
+            "ind": selected_feature_cols.get_loc(feature_col),
+            "shap_values": shap_value_df.to_numpy(dtype=np.float32),
+            "features": feature_df.astype(np.float32, copy=False),
+            "interaction_index": interaction_col,
+            "alpha": 0.5,
+            "dot_size": 10,
+            "show": False,
+            "ax": ax,
+        }
+        shap.dependence_plot(**shap_args)
+    if reuse_ax:
+        # Remember the added colorbar, so _clear_axes can give its space back
+        ax._shap_colorbar = (  # pylint: disable=protected-access
+            [extra_ax for extra_ax in ax.figure.axes if extra_ax not in axes_before],
+            position_before,
+        )
+    ax.set_title("{} Contribution to {}".format(feature_col, "target variable"))
 
     # Plot median SHAP line
-    _plot_median(plot_median_line, median_shap_df, feature_col, color_dir=None)
+    _plot_median(ax, plot_median_line, median_shap_df, feature_col, color_dir=None)
 
     # Set axis limit
-    _set_axis_limit(selected_xlim, selected_ylim)
+    _set_axis_limit(ax, selected_xlim, selected_ylim)
 
     # Plot histogram when the feature is not a binary variable
-    _plot_histogram(plot_histogram, feature_col, data_df, nbins)
+    _plot_histogram(ax, plot_histogram, feature_bins)
 
-    # plt.gcf().set_size_inches(figsize[0], figsize[1])
-    # plt.show()
+    return ax
 
 
 def plot_shap_dependence_plot_by_segment(
@@ -127,10 +184,12 @@ def plot_shap_dependence_plot_by_segment(
     plot_median_line: bool = False,
     selected_xlim: Union[List[float], None] = None,
     selected_ylim: Union[List[float], None] = None,
-    figsize: List[int] = [15, 10],
+    figsize: Tuple[int, int] = (15, 10),
     plot_histogram: bool = True,
     nbins: int = 35,
-) -> None:
+    ax: Union[Axes, None] = None,
+    backend: str = "auto",
+) -> Axes:
     """Plots dependence plot with overlapping histogram and by segment.
     Color-code the dots and median line by segment flags (may not be in selected features).
 
@@ -142,92 +201,306 @@ def plot_shap_dependence_plot_by_segment(
         plot_median_line (boolean): whether to show the median line for shap values.
         selected_xlim (list of two float or None): lower bound and upper bound of the x axis
         selected_ylim (list of two float or None): lower bound and upper bound of the y axis
-        figsize (list of two int): size of the plot.
+        figsize (tuple of two int): size of the new figure created when ax is None
+                                    and there is no current figure.
         plot_histogram (boolean): if True, a population histogram will be plotted in the background.
-        nbins (int): the number of bins in histogram.
+        nbins (int): the number of bins in histogram, also used by the median line
+                     of a feature with more than nbins distinct values.
+        ax (matplotlib Axes or None): the axes to draw on, the current axes if None.
+                                      A given axes is cleared first, so it can be reused.
+        backend (str): "matplotlib" draws every point, "datashader" draws a raster of
+                       point counts per segment. "auto" uses datashader when it is
+                       installed and there are more than DATASHADER_MIN_POINTS points.
+                       Raises ValueError for any other value.
 
     Returns:
+        The axes drawn on.
         Scatter plot of SHAP values for the selected feature.
         Creates histogram of the selected feature in the background.
         Color-code the scatter plot by selected flag.
         Color-code the median line by selected flag when plot_median_line = True.
 
     """
-    # Define categorical columns (used as segment column)
-    cat_cols = [x for x in data_df.columns if data_df[x].nunique() <= 5]
-
-    # Build contri_df for median lines
-    median_shap_df = _calculate_median_shap_df(
-        feature_col, data_df, shap_value_df, segment_col
-    )
+    # Extract the plotted columns once, shared by scatter, median line and histogram.
+    # The feature and its SHAP values are float32, the segment column keeps its
+    # dtype so its labels and quartiles are unchanged.
+    feature_values = _to_float32_array(data_df[feature_col])
+    shap_values = _to_float32_array(shap_value_df[feature_col])
+    segment_values = None if segment_col is None else data_df[segment_col]
+    # Bin the feature for the histogram, reused by a binned median line
+    feature_bins = _bin_feature(feature_values, nbins) if plot_histogram else None
+
+    # Build contri_df for median lines (only needed when they are plotted)
+    median_shap_df = None
+    if plot_median_line:
+        median_shap_df = _calculate_median_shap_df(
+            feature_col,
+            feature_values,
+            shap_values,
+            segment_col,
+            None if segment_values is None else segment_values.to_numpy(),
+            median_nbins=nbins,
+            feature_bins=feature_bins,
+        )
 
     # Color by segment_col
     if segment_col is not None:
-        if segment_col in cat_cols:
-            color_col, color_dir = _color_by_segment_col(data_df[segment_col])
-        else:
+        # Low-cardinality columns are used as categories directly
+        if segment_values.nunique() > 5:
             # Bin continuously feature into quartiles
-            segment_col_cat = pd.qcut(data_df[segment_col], 4)
-            color_col, color_dir = _color_by_segment_col(segment_col_cat)
+            segment_values = pd.qcut(segment_values, 4)
+        color_col, color_dir = _color_by_segment_col(segment_values)
     else:
         color_col = None
         color_dir = None
 
-    # Plot scatter plot
-    plt.scatter(
-        data_df[feature_col], shap_value_df[feature_col], c=color_col, s=10, alpha=0.5
-    )
+    # Plot scatter plot, clearing a reused axes (and its histogram twin) first
+    if ax is None:
+        # Size a new figure before drawing, so the layout uses its final extent
+        if not plt.get_fignums():
+            plt.figure(figsize=figsize)
+        ax = plt.gca()
+    else:
+        _clear_axes(ax)
+    if backend not in ("auto", "matplotlib", "datashader"):
+        raise ValueError(
+            f"backend must be 'auto', 'matplotlib' or 'datashader', got {backend!r}"
+        )
+    if backend == "auto":
+        use_datashader = (
+            len(feature_values) > DATASHADER_MIN_POINTS
+            and importlib.util.find_spec("datashader") is not None
+        )
+        backend = "datashader" if use_datashader else "matplotlib"
+    if backend == "datashader":
+        _datashade_scatter(ax, feature_values, shap_values, segment_values, color_dir)
+    else:
+        # Rasterized, so vector outputs (SVG/PDF) embed one image, not a path per point
+        ax.scatter(
+            feature_values,
+            shap_values,
+            c=color_col,
+            s=10,
+            alpha=0.5,
+            rasterized=True,
+        )
 
     # Plot title
-    plt.title(
+    ax.set_title(
         "{} Contribution to {}".format(feature_col, "target variable"), fontsize=15
     )
-    plt.xlabel("Feature: " + feature_col, fontsize=15)
-    plt.ylabel("SHAP value", fontsize=15)
+    ax.set_xlabel("Feature: " + feature_col, fontsize=15)
+    ax.set_ylabel("SHAP value", fontsize=15)
 
     # Create legend
     if segment_col is not None:
-        legend_elements = []
-        for value, color in color_dir.items():
-            legend_elements.append(
-                Patch(
-                    facecolor=color,
-                    edgecolor=color,
-                    label=segment_col + ": " + str(value),
-                )
-            )
-        plt.legend(handles=legend_elements)
+        legend_elements = [
+            Patch(facecolor=color, edgecolor=color, label=f"{segment_col}: {value}")
+            for value, color in color_dir.items()
+        ]
+        ax.legend(handles=legend_elements)
 
     # Plot median SHAP line
     _plot_median(
-        plot_median_line, median_shap_df, feature_col, segment_col, color_dir=color_dir
+        ax,
+        plot_median_line,
+        median_shap_df,
+        feature_col,
+        segment_col,
+        color_dir=color_dir,
     )
 
     # Set axis limit
-    _set_axis_limit(selected_xlim, selected_ylim)
+    _set_axis_limit(ax, selected_xlim, selected_ylim)
 
     # Plot histogram when the feature is not a binary variable
-    _plot_histogram(plot_histogram, feature_col, data_df, nbins)
+    _plot_histogram(ax, plot_histogram, feature_bins)
+
+    return ax
+
+
+def _to_float32_array(column: pd.Series) -> np.ndarray:
+    """Converts a column to a contiguous float32 array, without copying if it already is one."""
+    return np.ascontiguousarray(column.to_numpy(), dtype=np.float32)
+
+
+def _scatter_without_interaction(
+    ax: Axes,
+    feature_col: str,
+    feature_values: np.ndarray,
+    shap_values: np.ndarray,
+) -> None:
+    """Draws the SHAP dependence scatter plot without an interaction term,
+    as shap.dependence_plot(interaction_index=None) does: edgeless markers
+    in shap's blue, missing feature values as ticks along the y-axis,
+    and shap's axis labels and styling.
+
+    Args:
+        ax (matplotlib Axes): the axes to draw on
+        feature_col (str): name of the column that we want to visualize
+        feature_values (np.ndarray): the feature value of each data point
+        shap_values (np.ndarray): the SHAP value of each data point
+
+    Returns:
+        Scatter plot of SHAP values for the selected feature.
+
+    """
+    color = "#1E88E5"
+    axis_color = "#333333"
+    ax.scatter(
+        feature_values,
+        shap_values,
+        s=10,
+        linewidth=0,
+        color=color,
+        alpha=0.5,
+        rasterized=len(feature_values) > 500,
+    )
+
+    # Plot any missing feature values as tick marks along the y-axis
+    is_missing = np.isnan(feature_values)
+    xlim = ax.get_xlim()
+    ax.scatter(
+        np.full(is_missing.sum(), xlim[0]),
+        shap_values[is_missing],
+        marker=1,
+        linewidth=2,
+        color=color,
+        alpha=0.5,
+    )
+    ax.set_xlim(xlim)
+
+    ax.set_xlabel(feature_col, color=axis_color, fontsize=13)
+    ax.set_ylabel(
+        "SHAP value for\n{}".format(feature_col), color=axis_color, fontsize=13
+    )
+    ax.xaxis.set_ticks_position("bottom")
+    ax.yaxis.set_ticks_position("left")
+    ax.spines["right"].set_visible(False)
+    ax.spines["top"].set_visible(False)
+    ax.tick_params(color=axis_color, labelcolor=axis_color, labelsize=11)
+    for spine in ax.spines.values():
+        spine.set_edgecolor(axis_color)
+
+
+def _clear_axes(ax: Axes) -> None:
+    """Clears the axes so it can be drawn on again.
+    Also removes the colorbar shap added next to it, and hides its histogram twin.
+
+    Args:
+        ax (matplotlib Axes): the axes to clear
+
+    """
+    colorbar_axes, position = getattr(ax, "_shap_colorbar", ([], None))
+    for colorbar_ax in colorbar_axes:
+        colorbar_ax.remove()
+    if colorbar_axes:
+        ax.set_position(position)
+    ax._shap_colorbar = ([], None)  # pylint: disable=protected-access
+    ax.cla()
+    hist_ax = getattr(ax, "_shap_hist_twin", None)
+    if hist_ax is not None:
+        hist_ax.cla()
+        hist_ax.set_visible(False)
+
+
+def _datashade_scatter(
+    ax: Axes,
+    feature_values: np.ndarray,
+    shap_values: np.ndarray,
+    segment_values: Union[pd.Series, None] = None,
+    color_dir: Union[dict, None] = None,
+) -> None:
+    """Draws the scatter plot as a datashader raster on the axes.
+    Points are counted per pixel and segment, so the drawing cost
+    does not grow with the number of points.
 
-    # plt.gcf().set_size_inches(figsize[0], figsize[1])
-    # plt.show()
+    Args:
+        ax (matplotlib Axes): The axes to draw on.
+        feature_values (np.ndarray): the feature value of each data point.
+        shap_values (np.ndarray): the SHAP value of each data point.
+        segment_values (pd.Series or None): the segment of each data point.
+        color_dir (dict or None): color dict that map each segment to its color.
+
+    Returns:
+        Raster of the data points on the axes, colored by segment.
+
+    """
+    # Imported here, as datashader is optional and slow to import
+    try:
+        import datashader as ds  # pylint: disable=import-outside-toplevel
+        from datashader.mpl_ext import dsshow  # pylint: disable=import-outside-toplevel
+    except ImportError as err:
+        raise ImportError(
+            "backend='datashader' requires the optional datashader package"
+        ) from err
+
+    if segment_values is None:
+        categories = ["all"]
+        colors = [matplotlib.colors.to_hex("C0")]
+        segment_values = pd.Categorical.from_codes(
+            np.zeros(len(feature_values), dtype=np.int8), categories
+        )
+    else:
+        # Missing segments can't be a category, their points are left out
+        categories = [value for value in color_dir if not pd.isna(value)]
+        colors = [matplotlib.colors.to_hex(color_dir[value]) for value in categories]
+        segment_values = pd.Categorical(np.asarray(segment_values), categories)
+
+    # Missing or infinite coordinates would make dsshow's axis limits NaN,
+    # so leave those points out, as matplotlib's scatter does
+    is_finite = np.isfinite(feature_values) & np.isfinite(shap_values)
+    if not is_finite.any():
+        return
+    points = pd.DataFrame(
+        {
+            "x": feature_values[is_finite],
+            "y": shap_values[is_finite],
+            "segment": segment_values[is_finite],
+        }
+    )
+    dsshow(
+        points,
+        ds.Point("x", "y"),
+        ds.count_cat("segment"),
+        color_key=colors,
+        ax=ax,
+        aspect="auto",
+    )
 
 
 def _calculate_median_shap_df(
     feature_col: str,
-    data_df: pd.DataFrame,
-    shap_value_df: pd.DataFrame,
+    feature_values: np.ndarray,
+    shap_values: np.ndarray,
     segment_col: str = None,
+    segment_values: Union[np.ndarray, None] = None,
+    median_nbins: int = 64,
+    feature_bins: Union[Tuple[np.ndarray, np.ndarray], None] = None,
+    use_numba: bool = True,
 ) -> pd.DataFrame:
     """Calculates the median SHAP values for each distinct feature value.
+    Features with more than median_nbins distinct values are grouped into
+    median_nbins uniform bins instead, reported at the bin centers.
+    The threshold and the number of bins are the same, so a feature never
+    gets more median points by having more distinct values.
     If segment group (segment_col) is assigned, calculate by group separately.
 
     Args:
         feature_col (str): name of the column that we want to visualize
-        data_df (pd.DataFrame): the test data with selected features
-        shap_value_df (pd.DataFrame): the shap value matrix given by explainer.shap_values(data_df)
+        feature_values (np.ndarray): the feature value of each data point
+        shap_values (np.ndarray): the SHAP value of each data point
         segment_col (str): name of the column we use to color-code scatter plot.
                            Doesn't need to be a feature in the model.
+        segment_values (np.ndarray or None): the segment of each data point,
+                                             only used when segment_col is assigned.
+        median_nbins (int): the number of distinct values above which the feature is binned,
+                            also the number of bins.
+        feature_bins (tuple or None): the (bin index, bin edges) of the feature
+                                      from _bin_feature with median_nbins bins,
+                                      reused instead of binning again.
+        use_numba (boolean): whether to compute the medians with the numba kernel,
+                             only has an effect when numba is installed.
 
     Returns:
         if segment column (segment_col) is assigned:
@@ -236,37 +509,101 @@ def _calculate_median_shap_df(
             a pandas.DataFrame with columns [feature-name, median-SHAP-value]
 
     """
+    # Integer codes for each group key, sorted like groupby (NaN keys get -1)
+    # A single hashing pass gives both the codes and the number of distinct values
+    feature_codes, feature_groups = pd.factorize(feature_values)
+    if len(feature_groups) <= median_nbins:
+        # Sort the few distinct values and remap the codes to that order,
+        # the trailing -1 in code_map keeps missing values at code -1
+        value_order = np.argsort(feature_groups)
+        code_map = np.append(np.argsort(value_order), -1)
+        feature_codes = code_map[feature_codes]
+        feature_groups = feature_groups[value_order]
+    else:
+        # One group per value would be mostly medians of single points,
+        # so group by uniform bins instead
+        if feature_bins is None:
+            feature_bins = _bin_feature(feature_values, median_nbins)
+        feature_codes, edges = feature_bins
+        feature_groups = (edges[:-1] + edges[1:]) / 2
+    # Drop rows groupby would skip: missing keys or missing SHAP values
+    is_valid = (feature_codes >= 0) & ~np.isnan(shap_values)
+
+    # Flatten (feature, segment) into one linear key that keeps groupby's order
+    group_key = feature_codes
+    n_segments = 1
     if segment_col is not None:
-        # Assemble data for median line
-        contri_df = pd.DataFrame.from_dict(
-            {
-                feature_col: data_df[feature_col].values,
-                segment_col: data_df[segment_col].values,
-                "shap_value_df": shap_value_df[feature_col].values,
-            }
-        )
-        # Aggregate by segment column, and feature column
-        contri_df_agg = (
-            contri_df.groupby([feature_col, segment_col]).median().reset_index()
-        )
-        contri_df_agg.columns = [feature_col, segment_col, "Median"]
+        segment_codes, segment_groups = pd.factorize(segment_values, sort=True)
+        is_valid &= segment_codes >= 0
+        n_segments = len(segment_groups)
+        group_key = feature_codes * n_segments + segment_codes
+    shap_values = shap_values[is_valid]
+    # Smallest unsigned dtype for the key, so the stable argsorts use radix sort
+    group_key = group_key[is_valid].astype(
+        np.min_scalar_type(len(feature_groups) * n_segments)
+    )
 
+    # Sort rows by group so each group is a contiguous slice
+    use_numba = use_numba and njit is not None
+    if use_numba:
+        order = np.argsort(group_key, kind="stable")
     else:
-        # Assemble data for median line
-        contri_df = pd.DataFrame.from_dict(
-            {
-                feature_col: data_df[feature_col].values,
-                "shap_value_df": shap_value_df[feature_col].values,
-            }
-        )
-        # Aggregate by feature column
-        contri_df_agg = contri_df.groupby([feature_col]).median().reset_index()
-        contri_df_agg.columns = [feature_col, "Median"]
+        # Sort by SHAP value within each group too, see _group_medians
+        order = np.argsort(shap_values)
+        order = order[np.argsort(group_key[order], kind="stable")]
+    sorted_key = group_key[order]
+    is_start = np.ones(len(sorted_key), dtype=bool)
+    is_start[1:] = sorted_key[1:] != sorted_key[:-1]
+    offsets = np.append(np.flatnonzero(is_start), len(sorted_key))
+    if use_numba:
+        medians = _group_medians_numba(shap_values[order], offsets)
+    else:
+        medians = _group_medians(shap_values[order], offsets)
+
+    # Assemble the median line data in one go
+    group_key = sorted_key[offsets[:-1]]
+    contri_df_agg = {feature_col: feature_groups[group_key // n_segments]}
+    if segment_col is not None:
+        contri_df_agg[segment_col] = segment_groups[group_key % n_segments]
+    contri_df_agg["Median"] = medians
 
-    return contri_df_agg
+    return pd.DataFrame(contri_df_agg)
 
 
-def _color_by_segment_col(segment_col_df: pd.DataFrame) -> Tuple[list, dict]:
+def _group_medians(sorted_shap: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Calculates the median of each group slice sorted_shap[offsets[i]:offsets[i + 1]].
+
+    Values must also be sorted within each group,
+    so the median is the mean of the one or two middle elements.
+    """
+    sizes = np.diff(offsets)
+    starts = offsets[:-1]
+    return (
+        sorted_shap[starts + (sizes - 1) // 2] + sorted_shap[starts + sizes // 2]
+    ) / 2
+
+
+if njit is not None:
+
+    @njit
+    def _group_medians_numba(grouped_shap, offsets):
+        """Calculates the median of each group slice grouped_shap[offsets[i]:offsets[i + 1]].
+
+        Each median is a quickselect, so values only need to be grouped,
+        not sorted within each group. Serial on purpose: the groups are small,
+        and numba's default workqueue threading layer aborts on concurrent calls
+        from a threaded server.
+        Compiled on the first call in each process and not cached on disk:
+        the demo imports this file as plot_utils and the package under its full
+        name, and a cache written under one name fails to load under the other.
+        """
+        medians = np.empty(len(offsets) - 1)
+        for i in range(len(offsets) - 1):
+            medians[i] = np.median(grouped_shap[offsets[i] : offsets[i + 1]])
+        return medians
+
+
+def _color_by_segment_col(segment_col_df: pd.Series) -> Tuple[np.ndarray, dict]:
     """Generates the value for color column based on value of the input column.
 
     Args:
@@ -274,25 +611,30 @@ def _color_by_segment_col(segment_col_df: pd.DataFrame) -> Tuple[list, dict]:
                                     If continuous, bin values into quartiles.
 
     Returns:
-        color_col (list): assign color to each data points based on the value of segment_col.
+        color_col (np.ndarray): RGB color of each data point based on the value of segment_col.
         color_dir (dict): color dict that map each segment to its color.
 
     """
-    # Choose cmap for colors
-    cmap = matplotlib.cm.get_cmap("Set1")
-    color_dir = {}
-
-    # Create cmap for each segment
-    for i, cat in enumerate(segment_col_df.unique()):
-        color_dir[cat] = cmap.colors[i]
-    color_col = [color_dir[value] for value in segment_col_df]
+    # Integer code per data point, in order of appearance like unique()
+    codes, uniques = pd.factorize(segment_col_df)
+    uniques = list(uniques)
+    # Missing values are kept as their own segment
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(uniques), codes)
+        uniques.append(np.nan)
+
+    # One RGB row per data point, gathered from the small segment palette
+    palette = _SEGMENT_COLORS[: len(uniques)]
+    color_col = palette[codes]
+    color_dir = dict(zip(uniques, map(tuple, palette)))
 
     return (color_col, color_dir)
 
 
 def _plot_median(
+    ax: Axes,
     plot_median_line: bool,
-    median_shap_df: pd.DataFrame,
+    median_shap_df: Union[pd.DataFrame, None],
     feature_col: str,
     segment_col: Union[str, None] = None,
     color_dir: Union[dict, None] = None,
@@ -301,10 +643,12 @@ def _plot_median(
     Plot each group separately if segment group (segment_col) is assigned.
 
     Args:
+        ax (matplotlib Axes): The axes to draw on.
         plot_median_line (boolean): Whether to show the median line for shap values.
         median_shap_df (pd.DataFrame): df with columns [feature-name, flag-name, median-SHAP-value]
                                          if segment_col is assigned,
                                          else df with columns [feature-name, median-SHAP-value].
+                                         Only used (and may be None otherwise) if plot_median_line.
         feature_col (str): Name of the column that we want to visualize
         segment_col (str): Name of the column we use to color-code scatter plot.
                            Doesn't need to be a feature in the model.
@@ -318,41 +662,45 @@ def _plot_median(
     """
     if plot_median_line:
         if segment_col is None:
-            plt.plot(
+            ax.plot(
                 feature_col,
                 "Median",
                 data=median_shap_df,
                 label="Median Contribution for {}".format(feature_col),
             )
         else:
+            # Partition the rows by segment in one pass,
+            # rather than a boolean mask over all rows per segment
+            segment_codes, segments = pd.factorize(median_shap_df[segment_col])
+            order = np.argsort(segment_codes, kind="stable")
+            starts = np.searchsorted(segment_codes[order], np.arange(len(segments) + 1))
+            feature_values = median_shap_df[feature_col].to_numpy()[order]
+            medians = median_shap_df["Median"].to_numpy()[order]
+
             # Re-create color dictionary when segment_col is assigned,
             # but no color_dir is passed
             if color_dir is None:
-                # Create a list of color based on values of column segment_col
-                cmap = matplotlib.cm.get_cmap("Set1")
-                color_dir = {}
-                for i, cat in enumerate(median_shap_df[segment_col].unique()):
-                    color_dir[cat] = cmap.colors[i]
-
-            for cur_cate in median_shap_df[segment_col].unique():
-                plt.plot(
-                    feature_col,
-                    "Median",
-                    data=median_shap_df.loc[median_shap_df[segment_col] == cur_cate, :],
-                    label="Median Contribution for "
-                    + segment_col
-                    + "=={}".format(cur_cate),
+                color_dir = dict(zip(segments, map(tuple, _SEGMENT_COLORS)))
+
+            for i, cur_cate in enumerate(segments):
+                ax.plot(
+                    feature_values[starts[i] : starts[i + 1]],
+                    medians[starts[i] : starts[i + 1]],
+                    label=f"Median Contribution for {segment_col}=={cur_cate}",
                     color=color_dir[cur_cate],
                 )
-        plt.legend()
+        ax.legend()
 
 
 def _set_axis_limit(
-    selected_xlim: Union[List[float], None], selected_ylim: Union[List[float], None]
+    ax: Axes,
+    selected_xlim: Union[List[float], None],
+    selected_ylim: Union[List[float], None],
 ) -> None:
     """Manually sets the axis limits for x-axis and y-axis.
 
     Args:
+        ax (matplotlib Axes): the axes to change
         selected_xlim (list of two ints or None): lower bound and upper bound of the x axis
         selected_ylim (list of two ints or None): lower bound and upper bound of the y axis
 
@@ -361,37 +709,84 @@ def _set_axis_limit(
 
     """
     if selected_xlim is not None:
-        cur_axis = plt.gca()
-        cur_axis.set_xlim(selected_xlim)
+        ax.set_xlim(selected_xlim)
 
     if selected_ylim is not None:
-        cur_axis = plt.gca()
-        cur_axis.set_ylim(selected_ylim)
+        ax.set_ylim(selected_ylim)
+
+
+def _bin_feature(
+    feature_values: np.ndarray, nbins: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Assigns each feature value to one of nbins uniform bins over its range,
+    with a scale-and-cast rather than a search.
+
+    Args:
+        feature_values (np.ndarray): the feature value of each data point
+        nbins (int): the number of bins
+
+    Returns:
+        bin_idx (np.ndarray): the bin of each data point, -1 for missing values.
+        edges (np.ndarray): the nbins + 1 bin edges.
+
+    """
+    is_number = ~np.isnan(feature_values)
+    bin_idx = np.full(len(feature_values), -1, dtype=np.intp)
+    if not is_number.any():
+        return bin_idx, np.linspace(0, 1, nbins + 1)
+
+    low, high = feature_values[is_number].min(), feature_values[is_number].max()
+    if low == high:
+        # Same fallback range as np.histogram for a constant feature
+        low, high = low - 0.5, high + 0.5
+    scaled = (feature_values[is_number] - low) * (nbins / (high - low))
+    bin_idx[is_number] = np.clip(scaled.astype(np.intp), 0, nbins - 1)
+    return bin_idx, np.linspace(low, high, nbins + 1)
 
 
 def _plot_histogram(
-    plot_histogram: bool, feature_col: str, data_df: pd.DataFrame, nbins: int
+    ax: Axes,
+    plot_histogram: bool,
+    feature_bins: Union[Tuple[np.ndarray, np.ndarray], None],
 ) -> None:
     """Plots histogram of the selected feature in the background.
 
     Args:
+        ax (matplotlib Axes): The axes to draw the histogram behind
         plot_histogram (boolean): If True, a population histogram will be plotted in the background
-        feature_col (str): Name of the column that we want to visualize
-        data_df (pd.DataFrame): The test data with all columns
-        nbins (int): The number of bins in histogram
+        feature_bins (tuple or None): The (bin index, bin edges) of the feature from _bin_feature,
+                                      only used when plot_histogram is True
 
     Returns:
         Histogram plot in the background.
 
     """
     if plot_histogram:
-        ax1 = plt.gca()
-        ax2 = ax1.twinx()
-        ax2.hist(
-            data_df[feature_col],
-            bins=nbins,
+        # Bins are uniform, so a bincount replaces np.histogram's searchsorted
+        bin_idx, edges = feature_bins
+        bin_idx = bin_idx[bin_idx >= 0]
+        if len(bin_idx) == 0:
+            return
+        counts = np.bincount(bin_idx, minlength=len(edges) - 1)
+
+        # Reuse the twin axes from an earlier plot on this axes, if any,
+        # rather than adding another axes to the figure on every redraw
+        ax2 = getattr(ax, "_shap_hist_twin", None)
+        if ax2 is None:
+            ax2 = ax.twinx()
+            ax._shap_hist_twin = ax2  # pylint: disable=protected-access
+            # twinx makes the twin the current axes, keep plt.gca() on the main one
+            ax.figure.sca(ax)
+        else:
+            ax2.cla()
+            ax2.set_visible(True)
+        ax2.bar(
+            edges[:-1],
+            counts,
+            width=np.diff(edges),
+            align="edge",
             alpha=0.3,
             label="Histogram Count",
             color="grey",
         )
-        plt.legend(loc="upper left")
+        ax2.legend(loc="upper left")
@@ -62,6 +62,8 @@ setup(
             "jupyter_client>=5.1.0, <6.0",
             "tornado>=4.2, <6.0",
             "ipykernel>=4.8.1, <5.0",
-        ]
+        ],
+        # export_lib and treelite_runtime were removed in Treelite 4.0
+        "treelite": ["treelite>=1.0, <4.0", "treelite_runtime>=1.0, <4.0"],
     },
 )
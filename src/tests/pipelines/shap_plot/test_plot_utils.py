@@ -0,0 +1,158 @@
+# Copyright 2020 QuantumBlack Visual Analytics Limited
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE, AND
+# NONINFRINGEMENT. IN NO EVENT WILL THE LICENSOR OR OTHER CONTRIBUTORS
+# BE LIABLE FOR ANY CLAIM, DAMAGES, OR OTHER LIABILITY, WHETHER IN AN
+# ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF, OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The QuantumBlack Visual Analytics Limited ("QuantumBlack") name and logo
+# (either separately or in combination, "QuantumBlack Trademarks") are
+# trademarks of QuantumBlack. The License does not grant you any right or
+# license to the QuantumBlack Trademarks. You may not use the QuantumBlack
+# Trademarks or any confusingly similar mark as a trademark for your product,
+# or use the QuantumBlack Trademarks in any other manner that might cause
+# confusion in the marketplace, including but not limited to in advertising,
+# on websites, or on software.
+#
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Tests for the SHAP dependence plots. The median line is checked against
+the pandas groupby median it replaces.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib.figure import Figure
+
+from dash_demo_shap_plot.pipelines.shap_plot.plot_utils import (
+    _calculate_median_shap_df,
+    plot_shap_dependence_plot_by_segment,
+)
+
+
+def _make_data(n_values, seed=0, n_rows=2000):
+    rng = np.random.default_rng(seed)
+    feature_values = rng.integers(0, n_values, n_rows).astype(np.float32)
+    shap_values = rng.normal(size=n_rows).astype(np.float32)
+    segment_values = rng.choice(["a", "b", "c"], n_rows).astype(object)
+    # Missing values in every column, which groupby skips
+    feature_values[::17] = np.nan
+    shap_values[::23] = np.nan
+    segment_values[::29] = np.nan
+    return feature_values, shap_values, segment_values
+
+
+def _groupby_median(feature_values, shap_values, segment_values=None):
+    data = pd.DataFrame({"feature": feature_values, "Median": shap_values})
+    keys = ["feature"]
+    if segment_values is not None:
+        data["segment"] = segment_values
+        keys.append("segment")
+    return data.groupby(keys)["Median"].median().dropna().reset_index()
+
+
+@pytest.mark.parametrize("use_numba", [True, False])
+@pytest.mark.parametrize("with_segment", [True, False])
+def test_median_matches_groupby(use_numba, with_segment):
+    feature_values, shap_values, segment_values = _make_data(n_values=20)
+    if not with_segment:
+        segment_values = None
+    segment_col = "segment" if with_segment else None
+
+    result = _calculate_median_shap_df(
+        "feature",
+        feature_values,
+        shap_values,
+        segment_col=segment_col,
+        segment_values=segment_values,
+        use_numba=use_numba,
+    )
+
+    expected = _groupby_median(feature_values, shap_values, segment_values)
+    assert list(result.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(
+        result, expected, check_dtype=False, check_exact=False, rtol=1e-6
+    )
+
+
+@pytest.mark.parametrize("use_numba", [True, False])
+@pytest.mark.parametrize("with_segment", [True, False])
+def test_binned_median_matches_histogram_bins(use_numba, with_segment):
+    rng = np.random.default_rng(1)
+    n_rows = 5000
+    feature_values = rng.normal(size=n_rows).astype(np.float32)
+    shap_values = rng.normal(size=n_rows).astype(np.float32)
+    feature_values[::17] = np.nan
+    shap_values[::23] = np.nan
+    segment_values = None
+    segment_col = None
+    if with_segment:
+        segment_values = rng.choice(["a", "b"], n_rows).astype(object)
+        segment_values[::29] = np.nan
+        segment_col = "segment"
+    nbins = 16
+
+    result = _calculate_median_shap_df(
+        "feature",
+        feature_values,
+        shap_values,
+        segment_col=segment_col,
+        segment_values=segment_values,
+        median_nbins=nbins,
+        use_numba=use_numba,
+    )
+
+    # Reference: group by the np.histogram bin of each point, at the bin centers
+    is_number = ~np.isnan(feature_values)
+    _, edges = np.histogram(feature_values[is_number], bins=nbins)
+    bin_idx = np.clip(
+        np.searchsorted(edges, feature_values, side="right") - 1, 0, nbins - 1
+    )
+    centers = (edges[:-1] + edges[1:]) / 2
+    binned_values = np.where(is_number, centers[bin_idx], np.nan)
+    expected = _groupby_median(binned_values, shap_values, segment_values)
+    pd.testing.assert_frame_equal(
+        result, expected, check_dtype=False, check_exact=False, rtol=1e-5
+    )
+
+
+def test_median_of_all_missing_feature_is_empty():
+    shap_values = np.ones(10, dtype=np.float32)
+    feature_values = np.full(10, np.nan, dtype=np.float32)
+
+    result = _calculate_median_shap_df("feature", feature_values, shap_values)
+
+    assert result.empty
+    assert list(result.columns) == ["feature", "Median"]
+
+
+@pytest.mark.parametrize("segment_col", ["segment", None])
+def test_datashader_scatter_skips_missing_values(segment_col):
+    pytest.importorskip("datashader")
+    feature_values, shap_values, segment_values = _make_data(n_values=20)
+    data_df = pd.DataFrame({"feature": feature_values, "segment": segment_values})
+    shap_value_df = pd.DataFrame({"feature": shap_values})
+    ax = Figure().add_subplot()
+
+    plot_shap_dependence_plot_by_segment(
+        "feature",
+        shap_value_df,
+        data_df,
+        segment_col,
+        plot_median_line=True,
+        ax=ax,
+        backend="datashader",
+    )
+
+    assert np.isfinite(ax.get_xlim()).all()
+    assert np.isfinite(ax.get_ylim()).all()